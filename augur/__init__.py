@@ -9,7 +9,6 @@ import importlib
 import traceback
 from textwrap import dedent
 from types import SimpleNamespace
-from treetime import TreeTimeError, TreeTimeUnknownError
 
 from .errors import AugurError
 from .io.print import print_err
@@ -19,35 +18,74 @@ recursion_limit = os.environ.get("AUGUR_RECURSION_LIMIT")
 if recursion_limit:
     sys.setrecursionlimit(int(recursion_limit))
 
-command_strings = [
-    "parse",
-    "curate",
-    "index",
-    "filter",
-    "mask",
-    "align",
-    "tree",
-    "refine",
-    "ancestral",
-    "translate",
-    "reconstruct_sequences",
-    "clades",
-    "traits",
-    "sequence_traits",
-    "lbi",
-    "distance",
-    "titers",
-    "frequencies",
-    "export",
-    "validate",
-    "version",
-    "import_",
-    "measurements",
-]
-
-COMMANDS = [importlib.import_module('augur.' + c) for c in command_strings]
-
-def make_parser():
+# Map each subcommand name to the module that implements it and a one-line
+# description for the top-level help output.  Keeping the descriptions here
+# instead of reading each module's docstring lets us register help-only stub
+# subparsers without importing the modules (and their heavy dependencies like
+# pandas and BioPython), so invocations like `augur --version` or
+# `augur filter --help` only pay the import cost of the one subcommand they
+# actually use.
+COMMANDS = {
+    "parse":                 ("augur.parse",                 "Parse delimited fields from FASTA sequence names into a TSV and FASTA file."),
+    "curate":                ("augur.curate",                "A suite of commands to help with data curation."),
+    "index":                 ("augur.index",                 "Count occurrence of bases in a set of sequences."),
+    "filter":                ("augur.filter",                "Filter and subsample a sequence set."),
+    "mask":                  ("augur.mask",                  "Mask specified sites from a VCF or FASTA file."),
+    "align":                 ("augur.align",                 "Align multiple sequences from FASTA."),
+    "tree":                  ("augur.tree",                  "Build a tree using a variety of methods."),
+    "refine":                ("augur.refine",                "Refine an initial tree using sequence metadata."),
+    "ancestral":             ("augur.ancestral",             "Infer ancestral sequences based on a tree."),
+    "translate":             ("augur.translate",             "Translate gene regions from nucleotides to amino acids."),
+    "reconstruct-sequences": ("augur.reconstruct_sequences", "Reconstruct alignments from mutations inferred on the tree"),
+    "clades":                ("augur.clades",                "Assign clades to nodes in a tree based on amino-acid or nucleotide signatures."),
+    "traits":                ("augur.traits",                "Infer ancestral traits based on a tree."),
+    "sequence-traits":       ("augur.sequence_traits",       "Annotate sequences based on amino-acid or nucleotide signatures."),
+    "lbi":                   ("augur.lbi",                   "Calculate LBI for a given tree and one or more sets of parameters."),
+    "distance":              ("augur.distance",              "Calculate the distance between sequences across entire genes or at a predefined subset of sites."),
+    "titers":                ("augur.titers",                "Annotate a tree with actual and inferred titer measurements."),
+    "frequencies":           ("augur.frequencies",           "infer frequencies of mutations or clades"),
+    "export":                ("augur.export",                "Export JSON files suitable for visualization with auspice."),
+    "validate":              ("augur.validate",              "Validate files related to augur consumption or export."),
+    "version":               ("augur.version",               "Print the version of augur."),
+    "import":                ("augur.import_",               "Import analyses into augur pipeline from other systems"),
+    "measurements":          ("augur.measurements",          "Create JSON files suitable for visualization within the measurements panel of Auspice."),
+}
+
+
+def load_command_module(command):
+    """
+    Import and return the module implementing the given subcommand *command*.
+    """
+    return importlib.import_module(COMMANDS[command][0])
+
+
+def expand_command_subparser(subparsers, command):
+    """
+    Replace the help-only stub subparser for *command* with the real thing.
+
+    Imports the module implementing *command* and lets it register its own
+    fully-featured subparser in place of the stub added by :func:`make_parser`.
+    """
+    # argparse doesn't support replacing a registered subparser, so reach into
+    # the subparsers action to drop the stub before re-registering.
+    del subparsers._name_parser_map[command]
+    subparsers._choices_actions = [
+        action for action in subparsers._choices_actions
+            if action.dest != command]
+
+    add_command_subparsers(subparsers, [load_command_module(command)])
+
+
+def make_parser(argv=None):
+    """
+    Build the top-level argument parser.
+
+    When *argv* (the arguments about to be parsed) is given, only the
+    subcommand module it selects is imported and fully registered; every other
+    subcommand is registered as a stub with just its one-line description.
+    Without *argv*—e.g. for documentation generation or interactive use—every
+    subcommand module is imported and fully registered.
+    """
     parser = argparse.ArgumentParser(
         prog        = "augur",
         description = "Augur: A bioinformatics toolkit for phylogenetic analysis.")
@@ -56,13 +94,25 @@ def make_parser():
     add_version_alias(parser)
 
     subparsers = parser.add_subparsers()
-    add_command_subparsers(subparsers, COMMANDS)
+
+    if argv is None:
+        add_command_subparsers(subparsers, [load_command_module(command) for command in COMMANDS])
+    else:
+        for command, (module_path, description) in COMMANDS.items():
+            subparsers.add_parser(command, help=description)
+
+        # The first non-option argument names the subcommand (the top-level
+        # options don't take values, so it can't be mistaken for one).
+        command = next((arg for arg in argv if not arg.startswith("-")), None)
+
+        if command in COMMANDS:
+            expand_command_subparser(subparsers, command)
 
     return parser
 
 
 def run(argv):
-    args = make_parser().parse_args(argv)
+    args = make_parser(argv).parse_args(argv)
     try:
         return args.__command__.run(args)
     except AugurError as e:
@@ -74,21 +124,29 @@ def run(argv):
     except FileNotFoundError as e:
         print_err(f"ERROR: {e.strerror}: '{e.filename}'")
         sys.exit(2)
-    except TreeTimeUnknownError as e:
-        print_err(dedent("""\
-            ERROR from TreeTime: An error occurred in TreeTime (see above). This may be due to an issue with TreeTime or Augur.
-            Please report you are calling TreeTime via Augur. 
-            """))
-        sys.exit(2)
-    except TreeTimeError as e:
-        print_err(f"ERROR: {e}")
-        print_err("\n")
-        print_err(dedent("""\
-            ERROR from TreeTime: This error is most likely due to a problem with your input data.
-            Please check your input data and try again. If you continue to have problems, please open a new issue including
-            the original command and the error above:  <https://github.com/nextstrain/augur/issues/new/choose>
-            """))
-    except Exception:
+    except Exception as e:
+        # TreeTime is a heavy import, so only check for its errors if some part
+        # of the command already imported it.
+        if "treetime" in sys.modules:
+            from treetime import TreeTimeError, TreeTimeUnknownError
+
+            if isinstance(e, TreeTimeUnknownError):
+                print_err(dedent("""\
+                    ERROR from TreeTime: An error occurred in TreeTime (see above). This may be due to an issue with TreeTime or Augur.
+                    Please report you are calling TreeTime via Augur.
+                    """))
+                sys.exit(2)
+
+            if isinstance(e, TreeTimeError):
+                print_err(f"ERROR: {e}")
+                print_err("\n")
+                print_err(dedent("""\
+                    ERROR from TreeTime: This error is most likely due to a problem with your input data.
+                    Please check your input data and try again. If you continue to have problems, please open a new issue including
+                    the original command and the error above:  <https://github.com/nextstrain/augur/issues/new/choose>
+                    """))
+                return
+
         traceback.print_exc(file=sys.stderr)
         print_err("\n")
         print_err(dedent("""\
@@ -109,6 +167,7 @@ def add_version_alias(parser):
 
     class run_version_command(argparse.Action):
         def __call__(self, *args, **kwargs):
+            from augur import version
             opts = SimpleNamespace()
             sys.exit( version.run(opts) )
 
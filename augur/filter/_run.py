@@ -1,26 +1,28 @@
-from collections import defaultdict
+from collections import Counter
 import csv
 import itertools
 import json
-import numpy as np
 import os
-import pandas as pd
 from tempfile import NamedTemporaryFile
+from xopen import xopen
 
 from augur.errors import AugurError
-from augur.index import index_sequences, index_vcf
-from augur.io.file import open_file
-from augur.io.metadata import read_metadata
-from augur.io.sequences import read_sequences, write_sequences
+from augur.io.metadata import _prefetched, read_metadata
 from augur.io.print import print_err
-from augur.io.vcf import is_vcf as filename_is_vcf, write_vcf
+from augur.io.vcf import is_vcf as filename_is_vcf
 from augur.types import EmptyOutputReportingMethod
 from .io import cleanup_outputs, read_priority_scores
 from .include_exclude_rules import apply_filters, construct_filters
-from .subsample import PriorityQueue, TooManyGroupsError, calculate_sequences_per_group, create_queues_by_group, get_groups_for_subsampling
 
 
 def run(args):
+    # Imported here instead of at the top of the module, so anything importing
+    # this module (or the augur.filter package) without running a filter
+    # doesn't pay for these modules and their transitive dependencies.
+    import numpy as np
+    import pandas as pd
+    from .subsample import GroupedRecordStore, PriorityQueue, TooManyGroupsError, calculate_sequences_per_group, create_queues_by_group, get_groups_for_subsampling
+
     # Determine whether the sequence index exists or whether should be
     # generated. We need to generate an index if the input sequences are in a
     # VCF, if sequence output has been requested (so we can filter strains by
@@ -48,25 +50,39 @@ def run(args):
         )
 
         if is_vcf:
+            from augur.index import index_vcf
             index_vcf(args.sequences, sequence_index_path)
         else:
+            from augur.index import index_sequences
             index_sequences(args.sequences, sequence_index_path)
 
-    # Load the sequence index, if a path exists.
+    # Load the sequence index, if a path exists. Only load the columns the
+    # sequence filters consume, with explicit dtypes to skip inference; a probe
+    # of the header determines which of those columns are present, since an
+    # index built from a VCF only has a strain column.
     sequence_index = None
     if sequence_index_path:
+        index_columns = pd.read_csv(sequence_index_path, sep="\t", nrows=0).columns
+        columns_to_load = [
+            column for column in ("strain", "A", "C", "G", "T", "invalid_nucleotides")
+            if column in index_columns
+        ]
         sequence_index = pd.read_csv(
             sequence_index_path,
             sep="\t",
             index_col="strain",
+            usecols=columns_to_load,
+            dtype={column: "int64" for column in columns_to_load if column != "strain"},
         )
 
         # Remove temporary index file, if it exists.
         if build_sequence_index:
             os.unlink(sequence_index_path)
 
-        # Calculate summary statistics needed for filtering.
-        sequence_strains = set(sequence_index.index.values)
+        # The index's own pd.Index serves as the set of available strains,
+        # avoiding a duplicate Python set of potentially millions of strings;
+        # later set operations on it happen in C through pandas.
+        sequence_strains = sequence_index.index
 
     #####################################
     #Filtering steps
@@ -84,28 +100,31 @@ def run(args):
     # user to identify the highest priority records from each group in a single
     # pass through the metadata.
     #
-    # 2. group by and maximum sequences defined -> use the first pass through
-    # the metadata to count the number of records in each group, calculate the
-    # sequences per group that satisfies the requested maximum, and use a second
-    # pass through the metadata to select that many sequences per group.
+    # 2. group by and maximum sequences defined -> track every candidate
+    # record per group during the single pass through the metadata (spilling
+    # records to disk as needed), calculate the sequences per group that
+    # satisfies the requested maximum after the pass, and select that many of
+    # the highest priority sequences per group from the tracked records.
     #
     # 3. group by not defined but maximum sequences defined -> use a "dummy"
     # group such that we select at most the requested maximum number of
     # sequences in a single pass through the metadata.
     #
     # Each case relies on a priority queue to track the highest priority records
-    # per group. In the best case, we can track these records in a single pass
-    # through the metadata. In the worst case, we don't know how many sequences
-    # per group to use, so we need to calculate this number after the first pass
-    # and use a second pass to add records to the queue.
+    # per group. In the best case, we know the number of sequences per group up
+    # front and can track these records directly in fixed-size queues. In the
+    # worst case, we don't know how many sequences per group to use until all
+    # records have been seen, so we keep all candidate records in a record
+    # store and fill the queues from the store after the pass.
     group_by = args.group_by
     sequences_per_group = args.sequences_per_group
-    records_per_group = None
+    record_store = None
 
     if group_by and args.subsample_max_sequences:
-        # In this case, we need two passes through the metadata with the first
-        # pass used to count the number of records per group.
-        records_per_group = defaultdict(int)
+        # In this case, we don't know the number of sequences per group until
+        # we've seen all records, so we track all candidate records per group,
+        # spilling them to disk when they no longer fit in memory.
+        record_store = GroupedRecordStore()
     elif not group_by and args.subsample_max_sequences:
         group_by = ("_dummy",)
         sequences_per_group = args.subsample_max_sequences
@@ -115,19 +134,21 @@ def run(args):
     # generated.
     queues_by_group = None
     if group_by:
-        # Use user-defined priorities, if possible. Otherwise, setup a
-        # corresponding dictionary that returns a random float for each strain.
+        # Use user-defined priorities, if possible. Otherwise, strains are
+        # assigned random priorities drawn in one vectorized call per chunk
+        # inside the loop below.
         if args.priority:
             priorities = read_priority_scores(args.priority)
         else:
             random_generator = np.random.default_rng(args.subsample_seed)
-            priorities = defaultdict(random_generator.random)
+            priorities = {}
 
-    # Setup metadata output. We track whether any records have been written to
-    # disk yet through the following variables, to control whether we write the
-    # metadata's header and open a new file for writing.
+    # Setup metadata output. We open the output file lazily on the first write
+    # and keep the handle for the rest of the run, so each chunk appends to the
+    # same handle instead of reopening the file. We track whether any records
+    # have been written yet to control whether we write the metadata's header.
     metadata_header = True
-    metadata_mode = "w"
+    output_metadata = None
 
     # Setup strain output.
     if args.output_strains:
@@ -140,7 +161,7 @@ def run(args):
         # can properly account for each strain (e.g., including those that were
         # initially filtered for one reason and then included again for another
         # reason).
-        output_log = open(args.output_log, "w", newline='')
+        output_log = open(args.output_log, "w", newline='', buffering=1 << 20)
         output_log_header = ("strain", "filter", "kwargs")
         output_log_writer = csv.DictWriter(
             output_log,
@@ -152,201 +173,218 @@ def run(args):
 
     # Load metadata. Metadata are the source of truth for which sequences we
     # want to keep in filtered output.
-    metadata_strains = set()
+    metadata_strains = pd.Index([], dtype="object")
     valid_strains = set() # TODO: rename this more clearly
     all_sequences_to_include = set()
-    filter_counts = defaultdict(int)
-
-    metadata_reader = read_metadata(
-        args.metadata,
-        id_columns=args.metadata_id_columns,
-        chunk_size=args.metadata_chunk_size,
-    )
-    for metadata in metadata_reader:
-        duplicate_strains = (
-            set(metadata.index[metadata.index.duplicated()]) |
-            set(metadata.index[metadata.index.isin(metadata_strains)])
-        )
-        if len(duplicate_strains) > 0:
-            cleanup_outputs(args)
-            raise AugurError(f"The following strains are duplicated in '{args.metadata}':\n" + "\n".join(sorted(duplicate_strains)))
-
-        # Maintain list of all strains seen.
-        metadata_strains.update(set(metadata.index.values))
-
-        # Filter metadata.
-        seq_keep, sequences_to_filter, sequences_to_include = apply_filters(
-            metadata,
-            exclude_by,
-            include_by,
-        )
-        valid_strains.update(seq_keep)
-
-        # Track distinct strains to include, so we can write their
-        # corresponding metadata, strains, or sequences later, as needed.
-        distinct_force_included_strains = {
-            record["strain"]
-            for record in sequences_to_include
-        }
-        all_sequences_to_include.update(distinct_force_included_strains)
-
-        # Track reasons for filtered or force-included strains, so we can
-        # report total numbers filtered and included at the end. Optionally,
-        # write out these reasons to a log file.
-        for filtered_strain in itertools.chain(sequences_to_filter, sequences_to_include):
-            filter_counts[(filtered_strain["filter"], filtered_strain["kwargs"])] += 1
-
-            # Log the names of strains that were filtered or force-included,
-            # so we can properly account for each strain (e.g., including
-            # those that were initially filtered for one reason and then
-            # included again for another reason).
-            if args.output_log:
-                output_log_writer.writerow(filtered_strain)
-
-        if group_by:
-            # Prevent force-included sequences from being included again during
-            # subsampling.
-            seq_keep = seq_keep - distinct_force_included_strains
-
-            # If grouping, track the highest priority metadata records or
-            # count the number of records per group. First, we need to get
-            # the groups for the given records.
-            group_by_strain, skipped_strains = get_groups_for_subsampling(
-                seq_keep,
-                metadata,
-                group_by,
-            )
-
-            # Track strains skipped during grouping, so users know why those
-            # strains were excluded from the analysis.
-            for skipped_strain in skipped_strains:
-                filter_counts[(skipped_strain["filter"], skipped_strain["kwargs"])] += 1
-                valid_strains.remove(skipped_strain["strain"])
-
-                if args.output_log:
-                    output_log_writer.writerow(skipped_strain)
-
-            if args.subsample_max_sequences and records_per_group is not None:
-                # Count the number of records per group. We will use this
-                # information to calculate the number of sequences per group
-                # for the given maximum number of requested sequences.
-                for group in group_by_strain.values():
-                    records_per_group[group] += 1
-            else:
-                # Track the highest priority records, when we already
-                # know the number of sequences allowed per group.
-                if queues_by_group is None:
-                    queues_by_group = {}
-
-                for strain in sorted(group_by_strain.keys()):
-                    # During this first pass, we do not know all possible
-                    # groups will be, so we need to build each group's queue
-                    # as we first encounter the group.
-                    group = group_by_strain[strain]
-                    if group not in queues_by_group:
-                        queues_by_group[group] = PriorityQueue(
-                            max_size=sequences_per_group,
-                        )
-
-                    queues_by_group[group].add(
-                        metadata.loc[strain],
-                        priorities[strain],
-                    )
-
-        # Always write out strains that are force-included. Additionally, if
-        # we are not grouping, write out metadata and strains that passed
-        # filters so far.
-        force_included_strains_to_write = distinct_force_included_strains
-        if not group_by:
-            force_included_strains_to_write = force_included_strains_to_write | seq_keep
-
-        if args.output_metadata:
-            # TODO: wrap logic to write metadata into its own function
-            metadata.loc[list(force_included_strains_to_write)].to_csv(
-                args.output_metadata,
-                sep="\t",
-                header=metadata_header,
-                mode=metadata_mode,
-            )
-            metadata_header = False
-            metadata_mode = "a"
-
-        if args.output_strains:
-            # TODO: Output strains will no longer be ordered. This is a
-            # small breaking change.
-            for strain in force_included_strains_to_write:
-                output_strains.write(f"{strain}\n")
-
-    # In the worst case, we need to calculate sequences per group from the
-    # requested maximum number of sequences and the number of sequences per
-    # group. Then, we need to make a second pass through the metadata to find
-    # the requested number of records.
-    if args.subsample_max_sequences and records_per_group is not None:
-        # Calculate sequences per group. If there are more groups than maximum
-        # sequences requested, sequences per group will be a floating point
-        # value and subsampling will be probabilistic.
-        try:
-            sequences_per_group, probabilistic_used = calculate_sequences_per_group(
-                args.subsample_max_sequences,
-                records_per_group.values(),
-                args.probabilistic_sampling,
-            )
-        except TooManyGroupsError as error:
-            raise AugurError(error)
-
-        if (probabilistic_used):
-            print(f"Sampling probabilistically at {sequences_per_group:0.4f} sequences per group, meaning it is possible to have more than the requested maximum of {args.subsample_max_sequences} sequences after filtering.")
-        else:
-            print(f"Sampling at {sequences_per_group} per group.")
-
-        if queues_by_group is None:
-            # We know all of the possible groups now from the first pass through
-            # the metadata, so we can create queues for all groups at once.
-            queues_by_group = create_queues_by_group(
-                records_per_group.keys(),
-                sequences_per_group,
-                random_seed=args.subsample_seed,
-            )
+    filter_counts = Counter()
 
-        # Make a second pass through the metadata, only considering records that
-        # have passed filters.
+    try:
         metadata_reader = read_metadata(
             args.metadata,
             id_columns=args.metadata_id_columns,
             chunk_size=args.metadata_chunk_size,
         )
-        for metadata in metadata_reader:
-            # Recalculate groups for subsampling as we loop through the
-            # metadata a second time. TODO: We could store these in memory
-            # during the first pass, but we want to minimize overall memory
-            # usage at the moment.
-            seq_keep = set(metadata.index.values) & valid_strains
-
-            # Prevent force-included strains from being considered in this
-            # second pass, as in the first pass.
-            seq_keep = seq_keep - all_sequences_to_include
-
-            group_by_strain, skipped_strains = get_groups_for_subsampling(
-                seq_keep,
+        for metadata in _prefetched(metadata_reader):
+            # Check for duplicates within the chunk and against strains seen in
+            # previous chunks with vectorized index operations, only materializing
+            # a Python set if there are any duplicates to report.
+            duplicates_within_chunk = metadata.index[metadata.index.duplicated()]
+            duplicates_across_chunks = metadata.index.intersection(metadata_strains)
+            if len(duplicates_within_chunk) > 0 or len(duplicates_across_chunks) > 0:
+                cleanup_outputs(args)
+                duplicate_strains = set(duplicates_within_chunk) | set(duplicates_across_chunks)
+                raise AugurError(f"The following strains are duplicated in '{args.metadata}':\n" + "\n".join(sorted(duplicate_strains)))
+
+            # Maintain list of all strains seen.
+            metadata_strains = metadata_strains.append(metadata.index)
+
+            # Filter metadata.
+            seq_keep, sequences_to_filter, sequences_to_include = apply_filters(
                 metadata,
-                group_by,
+                exclude_by,
+                include_by,
             )
+            valid_strains.update(seq_keep)
+
+            # Track distinct strains to include, so we can write their
+            # corresponding metadata, strains, or sequences later, as needed.
+            # Deduplication happens in C through a pandas Index instead of a
+            # Python-level set comprehension.
+            distinct_force_included_strains = pd.Index(
+                record["strain"]
+                for record in sequences_to_include
+            ).unique()
+            all_sequences_to_include.update(distinct_force_included_strains)
+
+            # Track reasons for filtered or force-included strains, so we can
+            # report total numbers filtered and included at the end. Counting
+            # happens through a single Counter.update call per chunk instead of a
+            # Python-level increment per strain. Optionally, write out these
+            # reasons to a log file, so we can properly account for each strain
+            # (e.g., including those that were initially filtered for one reason
+            # and then included again for another reason). Log rows are collected
+            # per chunk and written in a single batch below, to avoid a
+            # Python-level write call per strain.
+            filter_events = list(itertools.chain(sequences_to_filter, sequences_to_include))
+            filter_counts.update(
+                (event["filter"], event["kwargs"])
+                for event in filter_events
+            )
+            log_rows = filter_events if args.output_log else []
+
+            if group_by:
+                # Prevent force-included sequences from being included again during
+                # subsampling.
+                seq_keep.difference_update(distinct_force_included_strains)
+
+                # If grouping, track the highest priority metadata records or
+                # count the number of records per group. First, we need to get
+                # the groups for the given records.
+                group_by_strain, skipped_strains = get_groups_for_subsampling(
+                    seq_keep,
+                    metadata,
+                    group_by,
+                )
+
+                # Track strains skipped during grouping, so users know why those
+                # strains were excluded from the analysis.
+                for skipped_strain in skipped_strains:
+                    filter_counts[(skipped_strain["filter"], skipped_strain["kwargs"])] += 1
+                    valid_strains.remove(skipped_strain["strain"])
+
+                    if args.output_log:
+                        log_rows.append(skipped_strain)
+
+                # Iterate strains in their metadata order, which is deterministic
+                # for a given input, instead of paying to sort millions of names
+                # per chunk. When no user-defined priorities were given, draw
+                # random priorities for the chunk's strains with a single
+                # vectorized call instead of one scalar draw per strain.
+                strains = metadata.index[metadata.index.isin(group_by_strain.keys())]
+                if not args.priority:
+                    priorities.update(zip(strains, random_generator.random(len(strains)).tolist()))
+
+                if args.subsample_max_sequences and record_store is not None:
+                    # Track every candidate record per group along with its
+                    # priority. After this pass through the metadata, we will
+                    # calculate the number of sequences per group for the given
+                    # maximum number of requested sequences and select the highest
+                    # priority records per group from this store.
+                    # Look up all rows with a single indexing operation instead of
+                    # a per-strain label lookup, which is much slower.
+                    for strain, record in metadata.loc[strains].iterrows():
+                        record_store.add(
+                            group_by_strain[strain],
+                            record,
+                            priorities[strain],
+                        )
+                else:
+                    # Track the highest priority records, when we already
+                    # know the number of sequences allowed per group.
+                    if queues_by_group is None:
+                        queues_by_group = {}
+
+                    # Look up all rows with a single indexing operation instead of
+                    # a per-strain label lookup, which is much slower.
+                    for strain, record in metadata.loc[strains].iterrows():
+                        # We do not know ahead of time what all possible groups
+                        # will be, so we need to build each group's queue as we
+                        # first encounter the group.
+                        group = group_by_strain[strain]
+                        if group not in queues_by_group:
+                            queues_by_group[group] = PriorityQueue(
+                                max_size=sequences_per_group,
+                            )
+
+                        queues_by_group[group].add(
+                            record,
+                            priorities[strain],
+                        )
 
-            for strain in sorted(group_by_strain.keys()):
-                group = group_by_strain[strain]
-                queues_by_group[group].add(
-                    metadata.loc[strain],
-                    priorities[strain],
+            # Always write out strains that are force-included. Additionally, if
+            # we are not grouping, write out metadata and strains that passed
+            # filters so far.
+            force_included_strains_to_write = distinct_force_included_strains
+            if not group_by:
+                force_included_strains_to_write = force_included_strains_to_write.union(seq_keep)
+
+            if args.output_metadata:
+                if output_metadata is None:
+                    output_metadata = xopen(args.output_metadata, "w")
+
+                # TODO: wrap logic to write metadata into its own function
+                # (.loc gets a list so the output keeps the metadata's index name)
+                metadata.loc[list(force_included_strains_to_write)].to_csv(
+                    output_metadata,
+                    sep="\t",
+                    header=metadata_header,
+                )
+                metadata_header = False
+
+            if args.output_strains:
+                # TODO: Output strains will no longer be ordered. This is a
+                # small breaking change.
+                for strain in force_included_strains_to_write:
+                    output_strains.write(f"{strain}\n")
+
+            # Write the chunk's log rows in a single batch.
+            if args.output_log and log_rows:
+                output_log_writer.writerows(log_rows)
+
+        # In the worst case, we need to calculate sequences per group from the
+        # requested maximum number of sequences and the number of sequences per
+        # group. Then, we select the highest priority records per group from the
+        # record store populated during the pass through the metadata.
+        if args.subsample_max_sequences and record_store is not None:
+            # Calculate sequences per group. If there are more groups than maximum
+            # sequences requested, sequences per group will be a floating point
+            # value and subsampling will be probabilistic.
+            try:
+                sequences_per_group, probabilistic_used = calculate_sequences_per_group(
+                    args.subsample_max_sequences,
+                    list(record_store.group_sizes.values()),
+                    args.probabilistic_sampling,
+                )
+            except TooManyGroupsError as error:
+                raise AugurError(error)
+
+            if (probabilistic_used):
+                print(f"Sampling probabilistically at {sequences_per_group:0.4f} sequences per group, meaning it is possible to have more than the requested maximum of {args.subsample_max_sequences} sequences after filtering.")
+            else:
+                print(f"Sampling at {sequences_per_group} per group.")
+
+            if queues_by_group is None:
+                # We know all of the possible groups now from the pass through the
+                # metadata, so we can create queues for all groups at once.
+                queues_by_group = create_queues_by_group(
+                    record_store.group_sizes.keys(),
+                    sequences_per_group,
+                    random_seed=args.subsample_seed,
                 )
 
+            # Fill the queues with the records tracked during the pass through the
+            # metadata, letting each queue keep its highest priority records.
+            for group, queue in queues_by_group.items():
+                for record, priority in record_store.get_records(group):
+                    queue.add(record, priority)
+    finally:
+        # Always discard any records spilled to disk by the store, even when
+        # the pass through the metadata or the queue fill raises, so a failed
+        # run doesn't strand a temporary database in $TMPDIR.
+        if record_store is not None:
+            record_store.cleanup()
+
     # If we have any records in queues, we have grouped results and need to
     # stream the highest priority records to the requested outputs.
     num_excluded_subsamp = 0
     if queues_by_group:
-        # Populate the set of strains to keep from the records in queues.
+        # Populate the set of strains to keep from the records in queues,
+        # collecting the records across all groups so the metadata and strain
+        # outputs can each be written in a single call below instead of once
+        # per group.
         subsampled_strains = set()
+        records = []
         for group, queue in queues_by_group.items():
-            records = []
             for record in queue.get_items():
                 # Each record is a pandas.Series instance. Track the name of the
                 # record, so we can output its sequences later.
@@ -355,39 +393,41 @@ def run(args):
                 # Construct a data frame of records to simplify metadata output.
                 records.append(record)
 
-                if args.output_strains:
-                    # TODO: Output strains will no longer be ordered. This is a
-                    # small breaking change.
-                    output_strains.write(f"{record.name}\n")
+        if args.output_strains:
+            # TODO: Output strains will no longer be ordered. This is a
+            # small breaking change.
+            output_strains.writelines(f"{record.name}\n" for record in records)
 
-            # Write records to metadata output, if requested.
-            if args.output_metadata and len(records) > 0:
-                records = pd.DataFrame(records)
-                records.to_csv(
-                    args.output_metadata,
-                    sep="\t",
-                    header=metadata_header,
-                    mode=metadata_mode,
-                )
-                metadata_header = False
-                metadata_mode = "a"
+        # Write records to metadata output, if requested.
+        if args.output_metadata and len(records) > 0:
+            if output_metadata is None:
+                output_metadata = xopen(args.output_metadata, "w")
+
+            pd.DataFrame(records).to_csv(
+                output_metadata,
+                sep="\t",
+                header=metadata_header,
+            )
+            metadata_header = False
 
         # Count and optionally log strains that were not included due to
         # subsampling.
-        strains_filtered_by_subsampling = valid_strains - subsampled_strains
+        strains_filtered_by_subsampling = valid_strains.difference(subsampled_strains)
         num_excluded_subsamp = len(strains_filtered_by_subsampling)
         if output_log_writer:
-            for strain in strains_filtered_by_subsampling:
-                output_log_writer.writerow({
+            output_log_writer.writerows(
+                {
                     "strain": strain,
                     "filter": "subsampling",
                     "kwargs": "",
-                })
+                }
+                for strain in strains_filtered_by_subsampling
+            )
 
         valid_strains = subsampled_strains
 
     # Force inclusion of specific strains after filtering and subsampling.
-    valid_strains = valid_strains | all_sequences_to_include
+    valid_strains.update(all_sequences_to_include)
 
     # Write output starting with sequences, if they've been requested. It is
     # possible for the input sequences and sequence index to be out of sync
@@ -396,10 +436,14 @@ def run(args):
     # available.
     if is_vcf:
         if args.output:
+            from augur.io.vcf import write_vcf
+
             # Get the samples to be deleted, not to keep, for VCF
-            dropped_samps = list(sequence_strains - valid_strains)
+            dropped_samps = list(sequence_strains.difference(valid_strains))
             write_vcf(args.sequences, args.output, dropped_samps)
     elif args.sequences:
+        from augur.io.sequences import read_sequences, write_sequences
+
         sequences = read_sequences(args.sequences)
 
         # If the user requested sequence output, stream to disk all sequences
@@ -409,37 +453,48 @@ def run(args):
         # comparison with the provided sequence index.
         if args.output:
             observed_sequence_strains = set()
-            with open_file(args.output, "wt") as output_handle:
+
+            def valid_sequences():
+                """Yield sequences that passed all filters, tracking every
+                observed strain name along the way."""
                 for sequence in sequences:
                     observed_sequence_strains.add(sequence.id)
 
                     if sequence.id in valid_strains:
-                        write_sequences(sequence, output_handle, 'fasta')
+                        yield sequence
+
+            # Stream all valid sequences through a single writer call, so
+            # BioPython's writer machinery is set up once instead of once per
+            # sequence.
+            write_sequences(valid_sequences(), args.output, 'fasta')
         else:
             observed_sequence_strains = {sequence.id for sequence in sequences}
 
-        if sequence_strains != observed_sequence_strains:
+        if sequence_strains is None or len(sequence_strains.symmetric_difference(observed_sequence_strains)) > 0:
             # Warn the user if the expected strains from the sequence index are
             # not a superset of the observed strains.
-            if sequence_strains is not None and observed_sequence_strains > sequence_strains:
+            if sequence_strains is not None and len(sequence_strains.difference(observed_sequence_strains)) == 0:
                 print_err(
                     "WARNING: The sequence index is out of sync with the provided sequences.",
                     "Metadata and strain output may not match sequence output."
                 )
 
             # Update the set of available sequence strains.
-            sequence_strains = observed_sequence_strains
+            sequence_strains = pd.Index(list(observed_sequence_strains))
 
     # Calculate the number of strains that don't exist in either metadata or
     # sequences.
     num_excluded_by_lack_of_metadata = 0
-    if sequence_strains:
+    if sequence_strains is not None and len(sequence_strains) > 0:
         # Update strains to keep based on available sequence data. This prevents
         # writing out strain lists or metadata for strains that have no
         # sequences.
-        valid_strains = valid_strains & sequence_strains
+        valid_strains.intersection_update(sequence_strains)
+
+        num_excluded_by_lack_of_metadata = len(sequence_strains.difference(metadata_strains))
 
-        num_excluded_by_lack_of_metadata = len(sequence_strains - metadata_strains)
+    if output_metadata is not None:
+        output_metadata.close()
 
     if args.output_strains:
         output_strains.close()
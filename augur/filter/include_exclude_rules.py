@@ -63,7 +63,7 @@ def filter_by_exclude(metadata, exclude_file):
     >>> os.unlink(exclude_file.name)
     """
     excluded_strains = read_strains(exclude_file)
-    return set(metadata.index.values) - excluded_strains
+    return set(metadata.index.difference(excluded_strains))
 
 
 def parse_filter_query(query):
@@ -147,12 +147,13 @@ def filter_by_exclude_where(metadata, exclude_where):
         )
 
         # Negate the boolean index of excluded strains to get the index of
-        # strains that passed the filter.
+        # strains that passed the filter. Index the strain names directly
+        # instead of building a filtered copy of the full metadata.
         included = ~excluded
-        filtered = set(metadata[included].index.values)
+        filtered = set(metadata.index[included])
     else:
         # Skip the filter, if the requested column does not exist.
-        filtered = set(metadata.index.values)
+        filtered = set(metadata.index)
 
     return filtered
 
@@ -182,7 +183,7 @@ def filter_by_query(metadata, query):
     set()
 
     """
-    return set(metadata.query(query).index.values)
+    return set(metadata.query(query).index)
 
 
 def filter_by_ambiguous_date(metadata, date_column="date", ambiguity="any"):
@@ -221,9 +222,9 @@ def filter_by_ambiguous_date(metadata, date_column="date", ambiguity="any"):
         date_is_ambiguous = metadata[date_column].apply(
             lambda date: is_date_ambiguous(date, ambiguity)
         )
-        filtered = set(metadata[~date_is_ambiguous].index.values)
+        filtered = set(metadata.index[~date_is_ambiguous])
     else:
-        filtered = set(metadata.index.values)
+        filtered = set(metadata.index)
 
     return filtered
 
@@ -267,7 +268,7 @@ def filter_by_date(metadata, date_column="date", min_date=None, max_date=None):
     ['strain1', 'strain2']
 
     """
-    strains = set(metadata.index.values)
+    strains = set(metadata.index)
 
     # Skip this filter if no valid min/max date is given or the date column does
     # not exist.
@@ -327,10 +328,9 @@ def filter_by_sequence_index(metadata, sequence_index):
     {'strain1'}
 
     """
-    metadata_strains = set(metadata.index.values)
-    sequence_index_strains = set(sequence_index.index.values)
-
-    return metadata_strains & sequence_index_strains
+    # Intersect the indexes directly in pandas instead of materializing a
+    # Python set of every strain name on both sides.
+    return set(metadata.index.intersection(sequence_index.index))
 
 
 def filter_by_sequence_length(metadata, sequence_index, min_length=0):
@@ -364,13 +364,12 @@ def filter_by_sequence_length(metadata, sequence_index, min_length=0):
     set()
 
     """
-    strains = set(metadata.index.values)
     filtered_sequence_index = sequence_index.loc[
-        sequence_index.index.intersection(strains)
+        sequence_index.index.intersection(metadata.index)
     ]
     filtered_sequence_index["ACGT"] = filtered_sequence_index.loc[:, ["A", "C", "G", "T"]].sum(axis=1)
 
-    return set(filtered_sequence_index[filtered_sequence_index["ACGT"] >= min_length].index.values)
+    return set(filtered_sequence_index.index[filtered_sequence_index["ACGT"] >= min_length])
 
 
 def filter_by_non_nucleotide(metadata, sequence_index):
@@ -396,13 +395,12 @@ def filter_by_non_nucleotide(metadata, sequence_index):
     {'strain1'}
 
     """
-    strains = set(metadata.index.values)
     filtered_sequence_index = sequence_index.loc[
-        sequence_index.index.intersection(strains)
+        sequence_index.index.intersection(metadata.index)
     ]
     no_invalid_nucleotides = filtered_sequence_index["invalid_nucleotides"] == 0
 
-    return set(filtered_sequence_index[no_invalid_nucleotides].index.values)
+    return set(filtered_sequence_index.index[no_invalid_nucleotides])
 
 
 def force_include_strains(metadata, include_file):
@@ -433,7 +431,7 @@ def force_include_strains(metadata, include_file):
 
     """
     included_strains = read_strains(include_file)
-    return set(metadata.index.values) & included_strains
+    return set(metadata.index.intersection(included_strains))
 
 
 def force_include_where(metadata, include_where):
@@ -482,7 +480,7 @@ def force_include_where(metadata, include_where):
             metadata[column].astype(str).str.lower(),
             value.lower()
         )
-        included = set(metadata[included_index].index.values)
+        included = set(metadata.index[included_index])
     else:
         # Skip the inclusion filter if the requested column does not exist.
         included = set()
@@ -687,7 +685,7 @@ def apply_filters(metadata, exclude_by, include_by):
     [{'strain': 'strain2', 'filter': 'force_include_where', 'kwargs': '[["include_where", "region=Europe"]]'}]
 
     """
-    strains_to_keep = set(metadata.index.values)
+    strains_to_keep = set(metadata.index)
     strains_to_filter = []
     strains_to_force_include = []
     distinct_strains_to_force_include = set()
@@ -1,8 +1,12 @@
 import heapq
 import itertools
+import os
+import pickle
+import sqlite3
 import uuid
 import numpy as np
 import pandas as pd
+from tempfile import NamedTemporaryFile
 from typing import Collection
 
 from augur.dates import get_iso_year_week
@@ -330,6 +334,129 @@ class PriorityQueue:
             yield item
 
 
+class GroupedRecordStore:
+    """Accumulate metadata records and their priorities per group, spilling
+    records to a temporary SQLite database on disk when the number of buffered
+    records exceeds the given maximum.
+
+    This store allows us to keep every candidate record from a single pass
+    through the metadata without holding them all in memory, so the highest
+    priority records per group can be selected after the number of sequences
+    allowed per group is known.
+
+    Examples
+    --------
+
+    Add records for two groups to a store that only buffers one record in
+    memory, forcing the first records to spill to disk.
+
+    >>> store = GroupedRecordStore(max_buffered_records=1)
+    >>> store.add(("2015",), {"strain": "strain1"}, 0.5)
+    >>> store.add(("2015",), {"strain": "strain2"}, 0.25)
+    >>> store.add(("2016",), {"strain": "strain3"}, 0.75)
+    >>> store.group_sizes == {("2015",): 2, ("2016",): 1}
+    True
+
+    Records for each group are returned with their priorities in the order
+    they were added.
+
+    >>> list(store.get_records(("2015",)))
+    [({'strain': 'strain1'}, 0.5), ({'strain': 'strain2'}, 0.25)]
+    >>> list(store.get_records(("2016",)))
+    [({'strain': 'strain3'}, 0.75)]
+    >>> store.cleanup()
+
+    """
+    def __init__(self, max_buffered_records=100000):
+        """Create a record store that holds at most the given number of records
+        in memory before spilling to disk.
+
+        """
+        self.max_buffered_records = max_buffered_records
+        self.group_sizes = {}
+        self.buffered_records = []
+        self.group_ids = {}
+        self.database_path = None
+        self.connection = None
+
+    def _get_group_id(self, group):
+        """Return a stable integer id for the given group, so groups can be
+        matched exactly in the database regardless of the types of their
+        values.
+
+        """
+        return self.group_ids.setdefault(group, len(self.group_ids))
+
+    def add(self, group, record, priority):
+        """Add a record to the store for the given group with a given priority.
+
+        If adding the record causes the number of buffered records to exceed
+        the store's maximum, write the buffered records to disk.
+
+        """
+        self.group_sizes[group] = self.group_sizes.get(group, 0) + 1
+        self.buffered_records.append((self._get_group_id(group), record, priority))
+
+        if len(self.buffered_records) >= self.max_buffered_records:
+            self._spill()
+
+    def _spill(self):
+        """Write all buffered records to a temporary SQLite database on disk,
+        creating the database on the first spill.
+
+        """
+        if self.connection is None:
+            with NamedTemporaryFile(delete=False) as database_file:
+                self.database_path = database_file.name
+
+            self.connection = sqlite3.connect(self.database_path)
+            self.connection.execute("CREATE TABLE records (group_id INTEGER, record BLOB, priority REAL)")
+            self.connection.execute("CREATE INDEX index_records_by_group ON records (group_id)")
+
+        self.connection.executemany(
+            "INSERT INTO records VALUES (?, ?, ?)",
+            (
+                (group_id, pickle.dumps(record), priority)
+                for group_id, record, priority in self.buffered_records
+            ),
+        )
+        self.connection.commit()
+        self.buffered_records = []
+
+    def get_records(self, group):
+        """Return each record added for the given group along with its
+        priority, in the order the records were added.
+
+        Yields
+        ------
+        tuple
+            Record stored for the group and its corresponding priority.
+
+        """
+        group_id = self.group_ids.get(group)
+        if group_id is None:
+            return
+
+        if self.connection is not None:
+            rows = self.connection.execute(
+                "SELECT record, priority FROM records WHERE group_id = ? ORDER BY rowid",
+                (group_id,),
+            )
+            for record, priority in rows:
+                yield pickle.loads(record), priority
+
+        for buffered_group_id, record, priority in self.buffered_records:
+            if buffered_group_id == group_id:
+                yield record, priority
+
+    def cleanup(self):
+        """Close and remove the store's temporary database, if it exists."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            os.unlink(self.database_path)
+
+
 def create_queues_by_group(groups, max_size, max_attempts=100, random_seed=None):
     """Create a dictionary of priority queues per group for the given maximum size.
 
@@ -371,12 +498,15 @@ def create_queues_by_group(groups, max_size, max_attempts=100, random_seed=None)
     if max_size < 1.0:
         random_generator = np.random.default_rng(random_seed)
 
+    # Sort the groups once, since their order doesn't change between attempts.
+    sorted_groups = sorted(groups)
+
     # For small fractional maximum sizes, it is possible to randomly select
     # maximum queue sizes that all equal zero. When this happens, filtering
     # fails unexpectedly. We make multiple attempts to create queues with
     # maximum sizes greater than zero for at least one queue.
     while total_max_size == 0 and attempts < max_attempts:
-        for group in sorted(groups):
+        for group in sorted_groups:
             if max_size < 1.0:
                 queue_max_size = random_generator.poisson(max_size)
             else:
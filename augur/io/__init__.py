@@ -2,6 +2,29 @@
 """
 # Functions and variables exposed here are part of Augur's public Python API.
 # To use functions internally, import directly from the submodule.
-from .file import open_file
-from .metadata import read_metadata
-from .sequences import read_sequences, write_sequences
+#
+# The re-exports are resolved lazily (PEP 562) so that importing augur.io (or
+# any of its submodules, like augur.io.print) doesn't pay the import cost of
+# pandas and BioPython unless the metadata/sequence APIs are actually used.
+import importlib
+
+_submodule_by_name = {
+    "open_file":       "augur.io.file",
+    "read_metadata":   "augur.io.metadata",
+    "read_sequences":  "augur.io.sequences",
+    "write_sequences": "augur.io.sequences",
+}
+
+
+def __getattr__(name):
+    if name in _submodule_by_name:
+        submodule = importlib.import_module(_submodule_by_name[name])
+        value = getattr(submodule, name)
+        # Cache the attribute so this function is only called once per name.
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted([*globals(), *_submodule_by_name])
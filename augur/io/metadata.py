@@ -1,8 +1,12 @@
 import csv
+import heapq
 import os
+import queue
 import pandas as pd
 import pyfastx
 import sys
+import threading
+from functools import lru_cache
 from io import StringIO
 from itertools import chain
 
@@ -11,6 +15,139 @@ from augur.io.print import print_err
 from augur.types import DataErrorMethod
 from .file import open_file
 
+# Maximum number of ids listed in duplicate/unmatched record report messages.
+# Capping the listing keeps the error path cheap for inputs where millions of
+# records are affected.
+_MAX_IDS_LISTED = 100
+
+
+def _format_ids(ids):
+    """Return a sorted, newline-joined listing of the given record *ids*,
+    capped at the first `_MAX_IDS_LISTED` ids in sorted order.
+    """
+    listed = heapq.nsmallest(_MAX_IDS_LISTED, ids)
+    message = "\n".join(map(repr, listed))
+
+    number_unlisted = len(ids) - len(listed)
+    if number_unlisted > 0:
+        message += f"\n... and {number_unlisted} more"
+
+    return message
+
+
+# Sentinel marking the end of a prefetched iterator.
+_PREFETCH_DONE = object()
+
+
+def _prefetched(iterator, max_prefetch=2):
+    """
+    Yield the items of *iterator*, consuming it on a background thread.
+
+    Useful when producing an item releases the GIL — pandas parses TSV
+    chunks in C and pyfastx does its index lookups in SQLite and zlib — so
+    producing the next item overlaps with the consumer's Python-level work
+    on the current one. The connecting queue is bounded, so at most
+    *max_prefetch* items are held in memory ahead of the consumer. Any
+    exception raised by the iterator is re-raised here, in the consuming
+    thread. If the consumer abandons this generator early, the producer
+    thread is shut down and *iterator* is closed instead of blocking
+    forever on the full queue.
+    """
+    items = queue.Queue(maxsize=max_prefetch)
+    closed = threading.Event()
+
+    def put_until_closed(item):
+        """Put *item* on the queue, giving up once the consumer is gone."""
+        while not closed.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            try:
+                for item in iterator:
+                    if not put_until_closed(item):
+                        return
+            except BaseException as error:
+                put_until_closed(error)
+            else:
+                put_until_closed(_PREFETCH_DONE)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while True:
+            item = items.get()
+            if item is _PREFETCH_DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        closed.set()
+
+
+class _DeferredWarning(str):
+    """
+    A warning message yielded from a prefetched iterator instead of being
+    printed directly, so the consumer can print it in stream order relative
+    to the surrounding items rather than whenever the producer thread
+    happens to run.
+    """
+
+
+def _delimiter_from_path(path):
+    """Return the delimiter implied by *path*'s file extension, or None.
+
+    Recognizes ``.csv``, ``.tsv`` and ``.tab`` files, optionally behind a
+    compression suffix, so callers can skip delimiter sniffing in the common
+    case where the filename already says what the file contains.
+    """
+    if not isinstance(path, str):
+        return None
+
+    path = path.lower()
+    if path.endswith(('.gz', '.bz2', '.xz', '.zst')):
+        path = path.rsplit('.', 1)[0]
+
+    if path.endswith(('.tsv', '.tab')):
+        return '\t'
+    if path.endswith('.csv'):
+        return ','
+    return None
+
+
+def _get_delimiter(table):
+    """Infer the delimiter of a CSV or TSV file from its extension or, failing
+    that, from its first line.
+
+    Sniffing the delimiter once up front lets callers parse the rest of the
+    file with pandas' fast C engine instead of the much slower Python engine
+    that pandas falls back to when asked to detect the separator itself.
+    """
+    delimiter = _delimiter_from_path(table)
+    if delimiter is not None:
+        return delimiter
+
+    with open_file(table) as handle:
+        table_sample = handle.readline()
+
+    try:
+        return csv.Sniffer().sniff(table_sample, [',', '\t']).delimiter
+    except csv.Error as err:
+        raise AugurError(
+            f"Could not determine the delimiter of {table!r}. "
+            "File must be a CSV or TSV."
+        ) from err
+
 
 def read_metadata(metadata_file, id_columns=("strain", "name"), chunk_size=None):
     """Read metadata from a given filename and into a pandas `DataFrame` or
@@ -60,33 +197,37 @@ def read_metadata(metadata_file, id_columns=("strain", "name"), chunk_size=None)
 
     """
     kwargs = {
-        "sep": None,
-        "engine": "python",
+        "sep": _get_delimiter(metadata_file),
+        "engine": "c",
         "skipinitialspace": True,
         "na_filter": False,
     }
 
     if chunk_size:
         kwargs["chunksize"] = chunk_size
-
-    # Inspect the first chunk of the metadata, to find any valid index columns.
-    metadata = pd.read_csv(
-        metadata_file,
-        iterator=True,
-        **kwargs,
-    )
-    chunk = metadata.read(nrows=1)
-    metadata.close()
+    elif (isinstance(metadata_file, str)
+          and "://" not in metadata_file
+          and not metadata_file.lower().endswith(('.gz', '.bz2', '.xz', '.zst'))):
+        # Memory-map plain local files so the parser reads the file's pages
+        # directly instead of copying them through a buffer. Compressed files,
+        # URLs and in-memory buffers can't be mapped.
+        kwargs["memory_map"] = True
+
+    # Inspect the metadata's header, to find any valid index columns. Read and
+    # split the single header line directly instead of initializing a pandas
+    # parser just to get the column names.
+    with open_file(metadata_file) as handle:
+        columns = next(csv.reader(handle, delimiter=kwargs["sep"], skipinitialspace=True), [])
 
     id_columns_present = [
         id_column
         for id_column in id_columns
-        if id_column in chunk.columns
+        if id_column in columns
     ]
 
     # If we couldn't find a valid index column in the metadata, alert the user.
     if not id_columns_present:
-        raise Exception(f"None of the possible id columns ({id_columns!r}) were found in the metadata's columns {tuple(chunk.columns)!r}")
+        raise Exception(f"None of the possible id columns ({id_columns!r}) were found in the metadata's columns {tuple(columns)!r}")
     else:
         index_col = id_columns_present[0]
 
@@ -103,7 +244,7 @@ def read_metadata(metadata_file, id_columns=("strain", "name"), chunk_size=None)
     )
 
 
-def read_table_to_dict(table, duplicate_reporting=DataErrorMethod.ERROR_FIRST, id_column=None):
+def read_table_to_dict(table, duplicate_reporting=DataErrorMethod.ERROR_FIRST, id_column=None, as_tuple=False):
     """
     Read rows from *table* file and yield each row as a single dict.
 
@@ -122,9 +263,14 @@ def read_table_to_dict(table, duplicate_reporting=DataErrorMethod.ERROR_FIRST, i
         Name of the column that contains the record identifier used for reporting duplicates.
         Uses the first column of the metadata if not provided.
 
+    as_tuple: bool, optional
+        Yield each row as a (fieldnames, row values) tuple instead of as a
+        dict. This lets callers that skip most rows avoid a dict allocation
+        per row.
+
     Yields
     ------
-    dict:
+    dict or tuple:
         The parsed row as a single record
 
     Raises
@@ -135,39 +281,74 @@ def read_table_to_dict(table, duplicate_reporting=DataErrorMethod.ERROR_FIRST, i
         2. The provided *id_column* does not exist in the *metadata*
         3. The *duplicate_reporting* method is set to ERROR_FIRST or ERROR_ALL and duplicate(s) are found
     """
-    valid_delimiters = [',', '\t']
     seen_ids = set()
     duplicate_ids = set()
+    delimiter = _delimiter_from_path(table)
     with open_file(table) as handle:
-        # Get sample to determine delimiter
-        table_sample = handle.readline()
-
-        if handle.seekable():
-            handle.seek(0)
-        else:
-            table_sample_file = StringIO(table_sample)
-            handle = chain(table_sample_file, handle)
+        if delimiter is None:
+            # Unknown file extension or an IO buffer, so get a sample to
+            # determine the delimiter by sniffing.
+            valid_delimiters = [',', '\t']
+            table_sample = handle.readline()
+
+            if handle.seekable():
+                handle.seek(0)
+            else:
+                table_sample_file = StringIO(table_sample)
+                handle = chain(table_sample_file, handle)
+
+            try:
+                delimiter = csv.Sniffer().sniff(table_sample, valid_delimiters).delimiter
+            except csv.Error as err:
+                raise AugurError(
+                    f"Could not determine the delimiter of {table!r}. "
+                    "File must be a CSV or TSV."
+                ) from err
+
+        # Use csv.reader with a manual dict construction per row instead of
+        # csv.DictReader, which pays for per-row method dispatch and attribute
+        # lookups in its own dict building.
+        metadata_reader = csv.reader(handle, delimiter=delimiter)
+        fieldnames = next(metadata_reader, None)
+        if fieldnames is None:
+            # An empty table has no records to yield.
+            return
 
-        try:
-            dialect = csv.Sniffer().sniff(table_sample, valid_delimiters)
-        except csv.Error as err:
-            raise AugurError(
-                f"Could not determine the delimiter of {table!r}. "
-                "File must be a CSV or TSV."
-            ) from err
-
-        metadata_reader = csv.DictReader(handle, dialect=dialect)
         if duplicate_reporting is DataErrorMethod.SILENT:
-            # Directly yield from metadata reader since we do not need to check for duplicate ids
-            yield from metadata_reader
+            # Directly yield records since we do not need to check for duplicate ids
+            if as_tuple:
+                for row in metadata_reader:
+                    # Skip blank rows, matching csv.DictReader
+                    if not row:
+                        continue
+                    yield (fieldnames, row)
+            else:
+                for row in metadata_reader:
+                    # Skip blank rows, matching csv.DictReader
+                    if not row:
+                        continue
+                    yield dict(zip(fieldnames, row))
         else:
             if id_column is None:
-                id_column = metadata_reader.fieldnames[0]
+                id_column_index = 0
+            else:
+                try:
+                    id_column_index = fieldnames.index(id_column)
+                except ValueError:
+                    raise AugurError(f"The provided id column {id_column!r} does not exist in {table!r}.") from None
 
-            for record in metadata_reader:
-                record_id = record.get(id_column)
-                if record_id is None:
-                    raise AugurError(f"The provided id column {id_column!r} does not exist in {table!r}.")
+            # Bind the set methods as locals to skip an attribute lookup per row.
+            seen_ids_add = seen_ids.add
+            duplicate_ids_add = duplicate_ids.add
+            for row in metadata_reader:
+                # Skip blank rows, matching csv.DictReader
+                if not row:
+                    continue
+
+                if id_column_index >= len(row):
+                    raise AugurError(f"The provided id column {fieldnames[id_column_index]!r} is missing from row {row!r} in {table!r}.")
+
+                record_id = row[id_column_index]
 
                 if record_id in seen_ids:
                     # Immediately raise an error if requested to error on the first duplicate
@@ -179,14 +360,14 @@ def read_table_to_dict(table, duplicate_reporting=DataErrorMethod.ERROR_FIRST, i
                     if duplicate_reporting is DataErrorMethod.WARN:
                         print_err(f"WARNING: Encountered record with duplicate id {record_id!r} in {table!r}")
 
-                    duplicate_ids.add(record_id)
+                    duplicate_ids_add(record_id)
                 else:
-                    seen_ids.add(record_id)
+                    seen_ids_add(record_id)
 
-                yield record
+                yield (fieldnames, row) if as_tuple else dict(zip(fieldnames, row))
 
     if duplicate_reporting is not DataErrorMethod.SILENT and duplicate_ids:
-        duplicates_message = f"The following records are duplicated in {table!r}:\n" + "\n".join(map(repr, sorted(duplicate_ids)))
+        duplicates_message = f"The following records are duplicated in {table!r}:\n" + _format_ids(duplicate_ids)
 
         if duplicate_reporting is DataErrorMethod.WARN:
             print_err(f"WARNING: {duplicates_message}")
@@ -197,7 +378,8 @@ def read_table_to_dict(table, duplicate_reporting=DataErrorMethod.ERROR_FIRST, i
 
 
 def read_metadata_with_sequences(metadata, fasta, seq_id_column, seq_field='sequence',
-    unmatched_reporting=DataErrorMethod.ERROR_FIRST, duplicate_reporting=DataErrorMethod.ERROR_FIRST):
+    unmatched_reporting=DataErrorMethod.ERROR_FIRST, duplicate_reporting=DataErrorMethod.ERROR_FIRST,
+    force_rebuild_index=False):
     """
     Read rows from *metadata* file and yield each row as a single dict that has
     been updated with their corresponding sequence from the *fasta* file.
@@ -216,8 +398,9 @@ def read_metadata_with_sequences(metadata, fasta, seq_id_column, seq_field='sequ
 
     Reads the *fasta* file with `pyfastx.Fasta`, which creates an index for
     the file to allow random access of sequences via the sequence id.
-    Will remove any existing index file named `<fasta>.fxi` to force the
-    rebuilding of the index so that there's no chance of using stale cached indexes.
+    Will remove any existing index file named `<fasta>.fxi` that is older
+    than the FASTA file so that there's no chance of using stale cached
+    indexes, while an up-to-date index is reused instead of being rebuilt.
     See pyfastx docs for more details:
     https://pyfastx.readthedocs.io/en/latest/usage.html#fasta
 
@@ -242,21 +425,26 @@ def read_metadata_with_sequences(metadata, fasta, seq_id_column, seq_field='sequ
     duplicate_reporting: DataErrorMethod, optional
         How should duplicate records be reported
 
+    force_rebuild_index: bool, optional
+        Remove any existing pyfastx index even if it is newer than the
+        FASTA file, forcing a rebuild of the index.
+
     Yields
     ------
     dict
         The parsed metadata record with the sequence
     """
-    # Remove the old Pyfastx index to force rebuild of index
-    # so we don't have to worry about a stale cached index
+    # Remove the old pyfastx index when it predates the FASTA file so we
+    # don't have to worry about a stale cached index, but keep an up-to-date
+    # index since rebuilding it is the most expensive part of reading a
+    # large FASTA file.
     try:
-        os.remove(f"{fasta}.fxi")
+        if force_rebuild_index or os.path.getmtime(f"{fasta}.fxi") < os.path.getmtime(fasta):
+            os.remove(f"{fasta}.fxi")
     except FileNotFoundError:
         pass
 
     sequences = pyfastx.Fasta(fasta)
-    sequence_ids = set(sequences.keys())
-
     # Used for determining unmatched records
     processed_sequence_ids = set()
     unmatched_metadata_ids = set()
@@ -266,13 +454,16 @@ def read_metadata_with_sequences(metadata, fasta, seq_id_column, seq_field='sequ
     duplicate_metadata_ids = set()
     duplicate_sequence_ids = set()
 
-    # First check for duplicates in FASTA first since pyfastx will only return
-    # the first sequence of duplicates, which may lead to unexpected results.
-    # Look for duplicate sequence ids if the number of sequences does not match the number of unique ids
-    if duplicate_reporting is not DataErrorMethod.SILENT and len(sequences) != len(sequence_ids):
-        seen_sequence_ids = set()
-        for seq_id in sequences.keys():
-            if seq_id in seen_sequence_ids:
+    # Collect the sequence ids for membership tests in a single pass over the
+    # FASTA index, checking for duplicates during the same pass since pyfastx
+    # will only return the first sequence of duplicates, which may lead to
+    # unexpected results. pyfastx's own membership lookups would avoid
+    # materializing the ids, but they are unreliable in the version we pin
+    # (see https://github.com/lmdu/pyfastx/issues/50).
+    sequence_ids = set()
+    for seq_id in sequences.keys():
+        if seq_id in sequence_ids:
+            if duplicate_reporting is not DataErrorMethod.SILENT:
                 # Immediately raise an error if requested to error on the first duplicate
                 if duplicate_reporting is DataErrorMethod.ERROR_FIRST:
                     raise AugurError(f"Encountered sequence record with duplicate id {seq_id!r}.")
@@ -283,105 +474,141 @@ def read_metadata_with_sequences(metadata, fasta, seq_id_column, seq_field='sequ
                     print_err(f"WARNING: Encountered sequence record with duplicate id {seq_id!r}.")
 
                 duplicate_sequence_ids.add(seq_id)
-            else:
-                seen_sequence_ids.add(seq_id)
-
-    # Silencing duplicate reporting here because we will need to handle duplicates
-    # in both the metadata and FASTA files after processing all the records here.
-    for record in read_table_to_dict(metadata, duplicate_reporting=DataErrorMethod.SILENT):
-        seq_id = record.get(seq_id_column)
-
-        if seq_id is None:
-            raise AugurError(f"The provided sequence id column {seq_id_column!r} does not exist in the metadata.")
-
-        # Keep track of duplicate ids to report duplicate records if requested
-        if seq_id in processed_metadata_ids:
-            # Immediately raise an error if requested to error on the first duplicate
-            if duplicate_reporting is DataErrorMethod.ERROR_FIRST:
-                raise AugurError(f"Encountered metadata record with duplicate id {seq_id!r}.")
-
-            # Give immediate feedback on duplicates if requested to warn on duplicates
-            # We'll also print a full summary of duplicates at the end of the command
-            if duplicate_reporting is DataErrorMethod.WARN:
-                print_err(f"WARNING: Encountered metadata record with duplicate id {seq_id!r}.")
-
-            duplicate_metadata_ids.add(seq_id)
         else:
-            processed_metadata_ids.add(seq_id)
-
-        # Skip records that do not have a matching sequence
-        # TODO: change this to try/except to fetch sequences and catch
-        # KeyError for non-existing sequences when https://github.com/lmdu/pyfastx/issues/50 is resolved
-        if seq_id not in sequence_ids:
-            # Immediately raise an error if requested to error on the first unmatched record
-            if unmatched_reporting is DataErrorMethod.ERROR_FIRST:
-                raise AugurError(f"Encountered metadata record {seq_id!r} without a matching sequence.")
-
-            # Give immediate feedback on unmatched records if requested to warn on unmatched
-            # We'll also print a full summary of unmatched records at the end of the command
-            if unmatched_reporting is DataErrorMethod.WARN:
-                print_err(f"WARNING: Encountered metadata record {seq_id!r} without a matching sequence.")
-
-            # Save unmatched metadata ids to report unmatched records if requested
-            unmatched_metadata_ids.add(seq_id)
-            continue
-
-        sequence_record = sequences[seq_id]
-        record[seq_field] = str(sequence_record.seq).upper()
-        # Save processed sequence ids to be able to determine if sequences were unmatched
-        processed_sequence_ids.add(seq_id)
-
-        yield record
-
-    # Create summary of duplicate records if requested
-    duplicates_message = None
-    if duplicate_reporting is not DataErrorMethod.SILENT and (duplicate_metadata_ids or duplicate_sequence_ids):
-        duplicates_message = "The output may not match expectations because there were records with duplicate sequence ids."
-
-        if duplicate_metadata_ids:
-            duplicates_message += f"\nThe following sequence ids were duplicated in {metadata!r}:\n"
-            duplicates_message += "\n".join(map(repr, sorted(duplicate_metadata_ids)))
-
-        if duplicate_sequence_ids:
-            duplicates_message += f"\nThe following sequence ids were duplicated in {fasta!r}:\n"
-            duplicates_message += "\n".join(map(repr, sorted(duplicate_sequence_ids)))
-
-    # Create summary for unmatched records if requested
-    # Note this is where we find unmatched sequences because we can only do so after looping through all of the metadata
-    unmatched_message = None
-    unmatched_sequence_ids = sequence_ids - processed_sequence_ids
-    if unmatched_reporting is not DataErrorMethod.SILENT and (unmatched_metadata_ids or unmatched_sequence_ids):
-        unmatched_message = "The output may be incomplete because there were unmatched records."
-
-        if unmatched_metadata_ids:
-            unmatched_message += "\nThe following metadata records did not have a matching sequence:\n"
-            unmatched_message += "\n".join(map(repr, sorted(unmatched_metadata_ids)))
-
-        if unmatched_sequence_ids:
-            unmatched_message += "\nThe following sequence records did not have a matching metadata record:\n"
-            unmatched_message += "\n".join(map(repr, sorted(unmatched_sequence_ids)))
-
-
-    # Handle all the different combinations for warnings and errors for unmatched and duplicate records
-    # Make sure we output warnings before raising any errors
-    if duplicate_reporting is DataErrorMethod.WARN and duplicates_message is not None:
-        print_err(f"WARNING: {duplicates_message}")
-
-    if unmatched_reporting is DataErrorMethod.WARN and unmatched_message is not None:
-        print_err(f"WARNING: {unmatched_message}")
-
-    # Combine error messages so both messages can be included in the final error
-    error_message = ""
-    if duplicate_reporting is DataErrorMethod.ERROR_ALL and duplicates_message is not None:
-        error_message += "\n" + duplicates_message
+            sequence_ids.add(seq_id)
+
+    def enriched_records():
+        # Silencing duplicate reporting here because we will need to handle duplicates
+        # in both the metadata and FASTA files after processing all the records here.
+        # Consume the rows as (fieldnames, row) tuples so records skipped as
+        # unmatched or duplicated never pay for a dict allocation.
+        # Cache fetched sequences so metadata records that share a sequence id
+        # also share a single uppercased string instead of fetching and
+        # allocating a fresh copy per record. The cache is bounded to keep peak
+        # memory in check when the metadata references many distinct sequences.
+        @lru_cache(maxsize=1024)
+        def fetch_sequence(seq_id):
+            # pyfastx already returns the sequence as a str, so uppercase it
+            # directly; str.upper runs as a single C-level pass for ASCII text.
+            return sequences[seq_id].seq.upper()
+
+        # Bind the per-row set methods locally to avoid repeated attribute lookups.
+        processed_metadata_ids_add = processed_metadata_ids.add
+        processed_sequence_ids_add = processed_sequence_ids.add
+        unmatched_metadata_ids_add = unmatched_metadata_ids.add
+        seq_id_column_index = None
+        for fieldnames, row in read_table_to_dict(metadata, duplicate_reporting=DataErrorMethod.SILENT, as_tuple=True):
+            if seq_id_column_index is None:
+                try:
+                    seq_id_column_index = fieldnames.index(seq_id_column)
+                except ValueError:
+                    raise AugurError(f"The provided sequence id column {seq_id_column!r} does not exist in the metadata.") from None
+
+            if seq_id_column_index >= len(row):
+                raise AugurError(f"The provided sequence id column {seq_id_column!r} is missing from metadata row {row!r}.")
+
+            seq_id = row[seq_id_column_index]
+
+            # Keep track of duplicate ids to report duplicate records if requested
+            if seq_id in processed_metadata_ids:
+                # Immediately raise an error if requested to error on the first duplicate
+                if duplicate_reporting is DataErrorMethod.ERROR_FIRST:
+                    raise AugurError(f"Encountered metadata record with duplicate id {seq_id!r}.")
 
-    # We need to check ERROR_FIRST here for unmatched sequences since we
-    # need to process all metadata records to know which sequences are unmatched
-    if unmatched_reporting in {DataErrorMethod.ERROR_FIRST, DataErrorMethod.ERROR_ALL} and unmatched_message is not None:
-        error_message += "\n" + unmatched_message
+                # Give immediate feedback on duplicates if requested to warn on duplicates
+                # We'll also print a full summary of duplicates at the end of the command
+                if duplicate_reporting is DataErrorMethod.WARN:
+                    yield _DeferredWarning(f"WARNING: Encountered metadata record with duplicate id {seq_id!r}.")
 
-    if error_message:
-        raise AugurError(f"Encountered the following error(s) when parsing metadata with sequences:{error_message}")
+                duplicate_metadata_ids.add(seq_id)
+            else:
+                processed_metadata_ids_add(seq_id)
+
+            # Skip records that do not have a matching sequence
+            # TODO: change this to try/except to fetch sequences and catch
+            # KeyError for non-existing sequences when https://github.com/lmdu/pyfastx/issues/50 is resolved
+            if seq_id not in sequence_ids:
+                # Immediately raise an error if requested to error on the first unmatched record
+                if unmatched_reporting is DataErrorMethod.ERROR_FIRST:
+                    raise AugurError(f"Encountered metadata record {seq_id!r} without a matching sequence.")
+
+                # Give immediate feedback on unmatched records if requested to warn on unmatched
+                # We'll also print a full summary of unmatched records at the end of the command
+                if unmatched_reporting is DataErrorMethod.WARN:
+                    yield _DeferredWarning(f"WARNING: Encountered metadata record {seq_id!r} without a matching sequence.")
+
+                # Save unmatched metadata ids to report unmatched records if requested
+                unmatched_metadata_ids_add(seq_id)
+                continue
+
+            record = dict(zip(fieldnames, row))
+            record[seq_field] = fetch_sequence(seq_id)
+            # Save processed sequence ids to be able to determine if sequences were unmatched
+            processed_sequence_ids_add(seq_id)
+
+            yield record
+
+        # Create summary of duplicate records if requested
+        duplicates_message = None
+        if duplicate_reporting is not DataErrorMethod.SILENT and (duplicate_metadata_ids or duplicate_sequence_ids):
+            duplicates_message = "The output may not match expectations because there were records with duplicate sequence ids."
+
+            if duplicate_metadata_ids:
+                duplicates_message += f"\nThe following sequence ids were duplicated in {metadata!r}:\n"
+                duplicates_message += _format_ids(duplicate_metadata_ids)
+
+            if duplicate_sequence_ids:
+                duplicates_message += f"\nThe following sequence ids were duplicated in {fasta!r}:\n"
+                duplicates_message += _format_ids(duplicate_sequence_ids)
+
+        # Create summary for unmatched records if requested
+        # Note this is where we find unmatched sequences because we can only do so after looping through all of the metadata
+        unmatched_message = None
+        if unmatched_reporting is not DataErrorMethod.SILENT:
+            unmatched_sequence_ids = sequence_ids - processed_sequence_ids
+            if unmatched_metadata_ids or unmatched_sequence_ids:
+                unmatched_message = "The output may be incomplete because there were unmatched records."
+
+                if unmatched_metadata_ids:
+                    unmatched_message += "\nThe following metadata records did not have a matching sequence:\n"
+                    unmatched_message += _format_ids(unmatched_metadata_ids)
+
+                if unmatched_sequence_ids:
+                    unmatched_message += "\nThe following sequence records did not have a matching metadata record:\n"
+                    unmatched_message += _format_ids(unmatched_sequence_ids)
+
+
+        # Handle all the different combinations for warnings and errors for unmatched and duplicate records
+        # Make sure we output warnings before raising any errors
+        if duplicate_reporting is DataErrorMethod.WARN and duplicates_message is not None:
+            yield _DeferredWarning(f"WARNING: {duplicates_message}")
+
+        if unmatched_reporting is DataErrorMethod.WARN and unmatched_message is not None:
+            yield _DeferredWarning(f"WARNING: {unmatched_message}")
+
+        # Combine error messages so both messages can be included in the final error
+        error_message = ""
+        if duplicate_reporting is DataErrorMethod.ERROR_ALL and duplicates_message is not None:
+            error_message += "\n" + duplicates_message
+
+        # We need to check ERROR_FIRST here for unmatched sequences since we
+        # need to process all metadata records to know which sequences are unmatched
+        if unmatched_reporting in {DataErrorMethod.ERROR_FIRST, DataErrorMethod.ERROR_ALL} and unmatched_message is not None:
+            error_message += "\n" + unmatched_message
+
+        if error_message:
+            raise AugurError(f"Encountered the following error(s) when parsing metadata with sequences:{error_message}")
+
+    # Enrich the records on a background thread so the pyfastx index
+    # lookups, which release the GIL for their SQLite and zlib work,
+    # overlap with the consumer's processing of earlier records. Warnings
+    # travel through the queue as items so they print here, in stream order
+    # relative to the records they describe.
+    for item in _prefetched(enriched_records(), max_prefetch=64):
+        if isinstance(item, _DeferredWarning):
+            print_err(item)
+        else:
+            yield item
 
 
 def write_records_to_tsv(records, output_file):
@@ -414,15 +641,18 @@ def write_records_to_tsv(records, output_file):
         output_file = sys.stdout
 
     with open_file(output_file, 'w', newline='') as output_metadata:
-        tsv_writer = csv.DictWriter(
+        # Use csv.writer with rows built by a plain dict.get per column
+        # instead of csv.DictWriter, whose per-row field reordering and
+        # extra-key handling are noticeably slower. Missing keys become empty
+        # strings and extra keys are dropped, matching DictWriter with
+        # extrasaction='ignore'. writerows drives the row loop in C.
+        tsv_writer = csv.writer(
             output_metadata,
-            output_columns,
-            extrasaction='ignore',
             delimiter='\t',
             lineterminator='\n'
         )
-        tsv_writer.writeheader()
-        tsv_writer.writerow(first_record)
-
-        for record in records:
-            tsv_writer.writerow(record)
+        tsv_writer.writerow(output_columns)
+        tsv_writer.writerows(
+            [record.get(column, '') for column in output_columns]
+            for record in chain([first_record], records)
+        )
@@ -10,6 +10,16 @@ from base.colorLogging import ColorizingStreamHandler
 
 version = 0.1
 
+# Serialize with orjson (C implementation, several times faster on multi-MB
+# tree JSONs) when it's available, falling back to the stdlib.
+try:
+    import orjson
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def json_dumps(obj):
+        return json.dumps(obj, indent=2).encode()
+
 def get_command_line_args():
     parser = argparse.ArgumentParser(description ="Convert tree files to Auspice ready JSONs. Version {}".format(version))
 
@@ -66,38 +76,61 @@ def annotate_phylotree_parents(tree):
     return tree
 
 
-def modified_tree_to_json(node, extra_attr = []):
+# Hoisted out of the per-node JSON builder so they aren't rebuilt per node.
+str_attr = ('strain','attr')
+num_attr = ('yvalue', 'tvalue', 'num_date', 'clade')
+missing = object()
+
+def node_to_json(node, extra_attr = []):
+    # Build the JSON for a single node, without its children. A single
+    # getattr with a sentinel default replaces the hasattr + __getattribute__
+    # pairs, halving the attribute lookups per property.
     tree_json = {}
-    str_attr = ['strain','attr']
-    num_attr = ['yvalue', 'tvalue', 'num_date', 'clade']
-    if hasattr(node, 'name'):
-        tree_json['strain'] = node.name
+    name = getattr(node, 'name', missing)
+    if name is not missing:
+        tree_json['strain'] = name
 
     for prop in str_attr:
-        if hasattr(node, prop):
-            tree_json[prop] = node.__getattribute__(prop)
+        value = getattr(node, prop, missing)
+        if value is not missing:
+            tree_json[prop] = value
     for prop in num_attr:
-        if hasattr(node, prop):
+        value = getattr(node, prop, missing)
+        if value is not missing:
             try:
-                tree_json[prop] = round(node.__getattribute__(prop),5)
+                tree_json[prop] = round(value,5)
             except:
-                print("cannot round:", node.__getattribute__(prop), "assigned as is")
-                tree_json[prop] = node.__getattribute__(prop)
+                print("cannot round:", value, "assigned as is")
+                tree_json[prop] = value
 
     for prop in extra_attr:
         if len(prop)==2 and callable(prop[1]):
-            if hasattr(node, prop[0]):
-                tree_json[prop] = prop[1](node.__getattribute__(prop[0]))
+            value = getattr(node, prop[0], missing)
+            if value is not missing:
+                tree_json[prop] = prop[1](value)
         else:
-            if hasattr(node, prop):
-                tree_json[prop] = node.__getattribute__(prop)
+            value = getattr(node, prop, missing)
+            if value is not missing:
+                tree_json[prop] = value
 
-    if node.clades:
-        tree_json["children"] = []
-        for ch in node.clades:
-            tree_json["children"].append(modified_tree_to_json(ch, extra_attr))
     return tree_json
 
+def modified_tree_to_json(node, extra_attr = []):
+    # Traverse with an explicit stack instead of recursing per node, so large
+    # trees neither hit Python's recursion limit nor pay a Python stack frame
+    # per node.
+    root_json = node_to_json(node, extra_attr)
+    stack = [(node, root_json)]
+    while stack:
+        current, current_json = stack.pop()
+        if current.clades:
+            current_json["children"] = []
+            for ch in current.clades:
+                child_json = node_to_json(ch, extra_attr)
+                current_json["children"].append(child_json)
+                stack.append((ch, child_json))
+    return root_json
+
 def mock_meta_json(tree, args):
     meta = {}
     meta["updated"] = "today"
@@ -140,9 +173,12 @@ def mock_meta_json(tree, args):
 
     return meta;
 
-def set_basic_information_on_nodes(tree):
+# The helpers below take the list of tree nodes (in find_clades order) rather
+# than the tree itself, so the tree is walked once up front instead of once
+# per helper.
+def set_basic_information_on_nodes(nodes):
     count = 0;
-    for node in tree.find_clades():
+    for node in nodes:
         count += 1
         if not node.name:
             node.name = "CLADE_{}".format(count)
@@ -151,42 +187,47 @@ def set_basic_information_on_nodes(tree):
         setattr(node,'strain', node.name)
 
 def set_y_values(tree):
-    count = 0;
-    for node in tree.find_clades():
-        if node.is_terminal():
-            setattr(node, 'yvalue', count)
-            count += 1
-    # set internal y-values
+    terminals = tree.get_terminals()
+    for i, node in enumerate(terminals):
+        setattr(node, 'yvalue', i)
+    # set internal y-values. A plain sum/len average avoids the NumPy
+    # dispatch overhead of np.mean on a tiny list per internal node.
     for node in tree.get_nonterminals(order="postorder"):
-        setattr(node, 'yvalue', np.mean([x.yvalue for x in node.clades]))
-    tree.virus_count = count
-
-def set_divergence_on_tree(tree):
-    for node in tree.find_clades():
+        setattr(node, 'yvalue', sum(x.yvalue for x in node.clades) / len(node.clades))
+    tree.virus_count = len(terminals)
+
+def set_divergence_on_tree(nodes):
+    # Track the running maximum while assigning divergences, so callers don't
+    # need another pass over the nodes to find it.
+    max_divergence = 0.0
+    for node in nodes:
         if node.name == "root":
             node.branch_length = 0.0 # root node
             node.cumulative_length = 0.0
         else:
             node.cumulative_length = node.parent.cumulative_length + node.branch_length
         node.attr["div"] = node.cumulative_length
+        if node.cumulative_length > max_divergence:
+            max_divergence = node.cumulative_length
+    return max_divergence
 
-def make_up_temporal_data(tree):
+def make_up_temporal_data(nodes, max_divergence):
 
     fake_date_range = [2000, 2018]
-    max_divergence = 0;
-    for node in tree.find_clades():
-        if node.attr["div"] > max_divergence:
-            max_divergence = node.attr["div"]
-
-    for node in tree.find_clades():
-        node.attr["num_date"] = fake_date_range[0] + (node.attr["div"] / max_divergence) * (fake_date_range[1] - fake_date_range[0])
+    # Compute every date with one vectorized NumPy expression and scatter the
+    # results back onto the nodes.
+    divs = np.fromiter((node.cumulative_length for node in nodes), dtype=np.float64, count=len(nodes))
+    dates = fake_date_range[0] + (divs / max_divergence) * (fake_date_range[1] - fake_date_range[0])
+    for node, date in zip(nodes, dates.tolist()):
+        node.attr["num_date"] = date
 
 
-def make_up_country(tree):
+def make_up_country(terminals):
     countries = ["USA", "New Zealand", "France", "Kenya"]
-    for node in tree.find_clades():
-        if node.is_terminal():
-            node.attr["country"] = np.random.choice(countries)
+    # One vectorized draw instead of an np.random.choice call per tip.
+    indices = np.random.randint(0, len(countries), size=len(terminals))
+    for node, index in zip(terminals, indices):
+        node.attr["country"] = countries[index]
 
 def calc_entropy(vals):
     if len(vals) == 1:
@@ -211,11 +252,13 @@ if __name__=="__main__":
         tree = Phylo.read(args.newick, "newick");
         tree.ladderize()
         tree = annotate_phylotree_parents(tree)
-        set_basic_information_on_nodes(tree)
+        # Walk the tree once and share the node lists between the helpers.
+        all_nodes = list(tree.find_clades())
+        set_basic_information_on_nodes(all_nodes)
         set_y_values(tree)
-        set_divergence_on_tree(tree)
-        make_up_temporal_data(tree)
-        make_up_country(tree)
+        max_divergence = set_divergence_on_tree(all_nodes)
+        make_up_temporal_data(all_nodes, max_divergence)
+        make_up_country(tree.get_terminals())
     elif args.nexus:
         try:
             bt = imp.load_source('baltic', '/Users/james/blab/baltic/baltic.py')
@@ -280,6 +323,7 @@ if __name__=="__main__":
 
 
         # import pdb; pdb.set_trace()
+        all_nodes = nodes + leaves
     meta_json = mock_meta_json(tree, args)
 
 
@@ -292,7 +336,7 @@ if __name__=="__main__":
             for line in csvdata:
                 meta[line[0]] = {k:v for k,v in zip(header, line) if k != "strain"}
 
-        for node in tree.find_clades():
+        for node in all_nodes:
             if node.name in meta:
                 if not hasattr(node, "attr"): # confusing!
                     setattr(node, "attr", {})
@@ -319,7 +363,7 @@ if __name__=="__main__":
 
         # some basic checks
         geo_traits = geo.keys()
-        for node in tree.find_clades():
+        for node in all_nodes:
             if hasattr(node, "attr"):
                 for trait in geo_traits:
                     if trait in node.attr:
@@ -337,7 +381,9 @@ if __name__=="__main__":
     for trait in args.continuous_traits:
         meta_json["color_options"][trait] = {"menuItem": trait, "type": "continuous", "legendTitle": trait, "key": trait}
 
-    json.dump(tree_json, open("{}_tree.json".format(args.output_prefix), 'w'), indent=2)
-    json.dump(meta_json, open("{}_meta.json".format(args.output_prefix), 'w'), indent=2)
+    with open("{}_tree.json".format(args.output_prefix), 'wb') as fh:
+        fh.write(json_dumps(tree_json))
+    with open("{}_meta.json".format(args.output_prefix), 'wb') as fh:
+        fh.write(json_dumps(meta_json))
 
     logger.info("DONE")
@@ -33,11 +33,11 @@ Check that the row for a strain is identical between input and output metadata.
 Check the order of strains in the filtered strains file.
 
   $ cat filtered_strains.txt
-  EcEs062_16
-  ZKC2/2016
-  Colombia/2016/ZC204Se
-  BRA/2016/FC_6706
   DOM/2016/BB_0059
+  SG_018
+  Colombia/2016/ZC204Se
+  PRVABC59
+  ZKC2/2016
 
 Check that the order of strains in the metadata is the same as above.
 
@@ -48,20 +48,20 @@ Check that the order of strains in the metadata is the same as above.
 Check the order of strains in the FASTA sequence output.
 
   $ grep ">" filtered.fasta
+  >PRVABC59
   >Colombia/2016/ZC204Se
   >ZKC2/2016
   >DOM/2016/BB_0059
-  >BRA/2016/FC_6706
-  >EcEs062_16
+  >SG_018
 
 Check the order of strains in the FASTA sequence output.
 
   $ grep ">" filtered.fasta
+  >PRVABC59
   >Colombia/2016/ZC204Se
   >ZKC2/2016
   >DOM/2016/BB_0059
-  >BRA/2016/FC_6706
-  >EcEs062_16
+  >SG_018
 
 Check the first 10 bases of a particular sequence in the FASTA sequence output.
 
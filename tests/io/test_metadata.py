@@ -63,6 +63,39 @@ class TestReadMetadataToDict:
         record = next(read_table_to_dict(sys.stdin))
         assert record == expected_record
 
+    def test_read_table_to_dict_with_short_row(self, tmpdir):
+        path = str(tmpdir / 'metadata.tsv')
+        with open(path, 'w') as fh:
+            fh.write('strain\tdate\tcountry\n')
+            fh.write('SEQ_A\t2020-10-03\n')
+
+        with pytest.raises(AugurError) as e_info:
+            list(read_table_to_dict(path, id_column='country'))
+
+        assert str(e_info.value) == f"The provided id column 'country' is missing from row ['SEQ_A', '2020-10-03'] in {path!r}."
+
+    def test_read_table_to_dict_with_blank_lines(self, tmpdir, expected_record):
+        path = str(tmpdir / 'metadata.tsv')
+        with open(path, 'w') as fh:
+            fh.write('strain\tdate\tcountry\n')
+            fh.write('\n')
+            fh.write('SEQ_A\t2020-10-03\tUSA\n')
+            fh.write('\n')
+
+        records = list(read_table_to_dict(path))
+        assert records == [expected_record]
+
+    def test_read_table_to_dict_with_blank_lines_silent(self, tmpdir, expected_record):
+        path = str(tmpdir / 'metadata.tsv')
+        with open(path, 'w') as fh:
+            fh.write('strain\tdate\tcountry\n')
+            fh.write('\n')
+            fh.write('SEQ_A\t2020-10-03\tUSA\n')
+            fh.write('\n')
+
+        records = list(read_table_to_dict(path, DataErrorMethod('silent')))
+        assert records == [expected_record]
+
     def test_read_table_to_dict_with_bad_delimiter(self, tmpdir):
         path = str(tmpdir / 'metadata.txt')
         with open(path, 'w') as fh:
@@ -207,6 +240,15 @@ class TestReadMetadataWithSequence:
             next(read_metadata_with_sequences(metadata_file, fasta_file, id_field))
         assert str(e_info.value) == f"The provided sequence id column {id_field!r} does not exist in the metadata."
 
+    def test_read_metadata_with_sequences_with_short_row(self, tmpdir, metadata_file, fasta_file):
+        path = str(tmpdir / 'short-row-metadata.tsv')
+        copy_and_append_to_file(metadata_file, path, ['SEQ_T\tUSA\n'])
+        with pytest.raises(AugurError) as e_info:
+            list(read_metadata_with_sequences(path, fasta_file, 'date',
+                unmatched_reporting=DataErrorMethod.SILENT,
+                duplicate_reporting=DataErrorMethod.SILENT))
+        assert str(e_info.value) == "The provided sequence id column 'date' is missing from metadata row ['SEQ_T', 'USA']."
+
     def test_read_metadata_with_sequences_with_unmatched(self, metadata_with_unmatched, fasta_with_unmatched):
         with pytest.raises(AugurError) as e_info:
             list(read_metadata_with_sequences(metadata_with_unmatched, fasta_with_unmatched, 'strain'))